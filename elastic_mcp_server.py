@@ -6,13 +6,19 @@ SPDX-License-Identifier: Apache-2.0
 """
 
 import os
-import json
+import asyncio
 import re
+import time
+import hashlib
+import sqlite3
 import logging
-from typing import Dict, Any, Optional
-import requests
-from elasticsearch import Elasticsearch
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, AsyncIterator, Callable, List, Tuple
+import httpx
+import orjson
+from elasticsearch import AsyncElasticsearch
 from dotenv import load_dotenv
+from pydantic import BaseModel, ConfigDict
 from mcp.server.fastmcp import FastMCP
 
 load_dotenv()
@@ -32,25 +38,225 @@ if not GOOGLE_MAPS_API_KEY:
 SEARCH_TEMPLATE_ID = os.environ.get("PROPERTIES_SEARCH_TEMPLATE")
 SEARCH_INDEX = os.getenv("ES_INDEX", "properties")
 
+# Geocode cache configuration (TTL in seconds, 0 keeps entries forever)
+GEOCODE_CACHE_PATH = os.getenv(
+    "GEOCODE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "geocode_cache.sqlite3"),
+)
+GEOCODE_CACHE_TTL = int(os.getenv("GEOCODE_CACHE_TTL", "0"))
+
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+GEOCODE_ATTEMPTS = 4
+GEOCODE_BACKOFF = 0.25
+_RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+# Locations already ending in a state code (e.g. "Tampa, FL") skip the Florida fallback
+_STATE_SUFFIX_RE = re.compile(r",\s*[A-Z]{2}$")
+
+# Mustache variables such as {{bedrooms}} in the search template
+_PARAM_RE = re.compile(r"\{\{\s*([a-zA-Z0-9_]+)\s*\}\}")
+
+# Control characters stripped from template sources, keeping tab, newline and CR
+_DEL_TBL = dict.fromkeys(i for i in range(0x20) if i not in (0x09, 0x0A, 0x0D))
+_DEL_TBL.update(dict.fromkeys(range(0x7F, 0xA0)))
+
+# Parameter guidance returned by get_properties_template_params
+_PARAMS_DOC = """Required parameters for properties search template: {parameters_list}
+
+    Parameter descriptions:
+      - bathrooms: Number of bathrooms
+      - tax: Real estate tax amount
+      - maintenance: Maintenance fee amount
+      - square_footage_min: Minimum property square footage. If only a max square footage is provided, set this to 0. otherwise, set this to the minimum square footage specified by the user.
+      - square_footage_max: Maximum property square footage
+      - home_price_min: Minimum home price.  If only a max home price is provided, set this to 0. otherwise, set this to the minimum home price specified by the user.
+      - home_price_max: Maximum home price
+      - property_features: Home features such as AC, pool, updated kitchens, etc should be listed as a single string For example features such as pool and updated kitchen should be formated as pool updated kitchen
+      """
+
+# Sanitized template sources keyed by template id: (fetched at, source)
+TEMPLATE_CACHE_TTL = 60
+TEMPLATE_CACHE_SIZE = 16
+_script_cache: Dict[str, Tuple[float, str]] = {}
+
+# Digest of the last source fetched for each template id
+_script_digests: Dict[str, str] = {}
+
+# Parsed template parameters keyed by template id: (source digest, parameters)
+_tpl_cache: Dict[str, Tuple[str, List[str]]] = {}
+
+# Hit fields returned by search_template, in result order
+_FIELDS = (
+    "title",
+    "tax",
+    "maintenance_fee",
+    "bathrooms",
+    "bedrooms",
+    "square_footage",
+    "home_price",
+    "property_features",
+)
+_DEFAULT = ["N/A"]
+_FIELD_DEFAULTS = {k: _DEFAULT for k in _FIELDS}
+_FIELD_DEFAULTS["title"] = ["No title"]
+_EMPTY: Dict[str, Any] = {}
+
+# Only the parts of a search response that search_template reads
+_SEARCH_FILTER_PATH = ["hits.hits.fields", "hits.total.value"]
+# status is kept so every msearch response survives filtering and stays in order
+_MSEARCH_FILTER_PATH = [
+    "responses.status",
+    "responses.error",
+    "responses.hits.hits.fields",
+    "responses.hits.total.value",
+]
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
+# httpx logs every request URL at INFO, and geocoding URLs carry the API key
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+_aclient: Optional[httpx.AsyncClient] = None
 
-mcp = FastMCP("elasticsearch-mcp-server")
 
-es = Elasticsearch(
-    hosts=[ELASTIC_ENDPOINT],
-    api_key=ELASTIC_API_KEY,
+async def _get_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client, creating it on first use."""
+    global _aclient
+    if _aclient is None:
+        _aclient = httpx.AsyncClient(
+            http2=True,
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        )
+    return _aclient
+
+
+_es: Optional[AsyncElasticsearch] = None
+
+
+async def _get_es() -> AsyncElasticsearch:
+    """Return the shared Elasticsearch client, creating it on first use."""
+    global _es
+    if _es is None:
+        # httpx is already a dependency, so use it as the transport instead of aiohttp
+        _es = AsyncElasticsearch(
+            hosts=[ELASTIC_ENDPOINT],
+            api_key=ELASTIC_API_KEY,
+            node_class="httpxasync",
+            http_compress=True,
+            request_timeout=30,
+            connections_per_node=32,
+        )
+    return _es
+
+
+_sessions = 0
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[None]:
+    # FastMCP enters the lifespan once per client session, so the shared
+    # clients are only closed once the last open session ends
+    global _aclient, _es, _sessions
+    _sessions += 1
+    try:
+        yield
+    finally:
+        _sessions -= 1
+        if _sessions == 0:
+            if _es is not None:
+                await _es.close()
+                _es = None
+            if _aclient is not None:
+                await _aclient.aclose()
+                _aclient = None
+
+
+mcp = FastMCP("elasticsearch-mcp-server", lifespan=lifespan)
+
+_geocache = sqlite3.connect(GEOCODE_CACHE_PATH, check_same_thread=False)
+_geocache.execute(
+    "CREATE TABLE IF NOT EXISTS geocache "
+    "(key TEXT PRIMARY KEY, lat REAL, lng REAL, ts INTEGER)"
 )
+_geocache.commit()
+
+
+def _geocache_key(location: str) -> str:
+    return re.sub(r"\s+", " ", location.strip().lower())
+
 
+def _geocache_get(key: str) -> Optional[Dict[str, float]]:
+    """Return a cached geo_point for the key, or None on a miss or expired entry."""
+    row = _geocache.execute(
+        "SELECT lat, lng, ts FROM geocache WHERE key = ?", (key,)
+    ).fetchone()
+    if row is None:
+        return None
+
+    lat, lng, ts = row
+    if GEOCODE_CACHE_TTL and time.time() - ts > GEOCODE_CACHE_TTL:
+        _geocache.execute("DELETE FROM geocache WHERE key = ?", (key,))
+        _geocache.commit()
+        return None
+
+    return {"latitude": lat, "longitude": lng}
+
+
+def _geocache_put(key: str, geo_point: Dict[str, float]) -> None:
+    _geocache.execute(
+        "INSERT OR REPLACE INTO geocache (key, lat, lng, ts) VALUES (?, ?, ?, ?)",
+        (key, geo_point["latitude"], geo_point["longitude"], int(time.time())),
+    )
+    _geocache.commit()
+
+
+def _geocoded_response(location: str, geo_point: Dict[str, float]) -> Dict[str, Any]:
+    return {
+        "content": [
+            {
+                "type": "text",
+                "text": f"Geocoded '{location}' to: {orjson.dumps(geo_point).decode()}",
+            }
+        ],
+        "data": geo_point,
+    }
+
+
+def _source_digest(source: str) -> str:
+    return hashlib.blake2b(source.encode(), digest_size=8).hexdigest()
+
+
+def _invalidate_template_cache(template_id: Optional[str] = None) -> None:
+    """Drop one cached template source, or all of them, e.g. after a re-put."""
+    if template_id is None:
+        _script_cache.clear()
+    else:
+        _script_cache.pop(template_id, None)
 
-def get_template_script(template_id: str) -> Optional[str]:
+
+async def get_template_script(template_id: str) -> Optional[str]:
+
+    cached = _script_cache.get(template_id)
+    if cached and time.monotonic() - cached[0] < TEMPLATE_CACHE_TTL:
+        return cached[1]
 
     # Get template from Elasticsearch using the client's get_script API
     try:
-        response = es.get_script(id=template_id)
+        es = await _get_es()
+        response = await es.get_script(id=template_id)
         source = response["script"]["source"]
-        source = "".join(c for c in source if c.isprintable() or c in "\n\r\t")
+        source = source.translate(_DEL_TBL)
+        _script_digests[template_id] = _source_digest(source)
+
+        # Evict the oldest entry once the cache is full
+        if (
+            template_id not in _script_cache
+            and len(_script_cache) >= TEMPLATE_CACHE_SIZE
+        ):
+            _script_cache.pop(next(iter(_script_cache)))
+        _script_cache[template_id] = (time.monotonic(), source)
         return source
     except Exception as e:
         logger.error(f"Failed to get template: {str(e)}")
@@ -61,28 +267,22 @@ def get_template_script(template_id: str) -> Optional[str]:
 async def get_properties_template_params() -> Dict[str, Any]:
     """Get the required parameters for the properties search template."""
     template_id = SEARCH_TEMPLATE_ID
-    source = get_template_script(template_id)
+    source = await get_template_script(template_id)
     if not source:
         return {"type": "text", "text": "Error getting template script."}
 
-    # Find parameters in template
-    param_matches = re.findall(r"\{\{\s*([a-zA-Z0-9_]+)\s*\}\}", source)
-    parameters = list(set(param_matches))
+    # Find parameters in template, reusing the parse while the source is unchanged
+    digest = _script_digests[template_id]
+    cached = _tpl_cache.get(template_id)
+    if cached and cached[0] == digest:
+        parameters = cached[1]
+    else:
+        parameters = list(dict.fromkeys(_PARAM_RE.findall(source)))
+        _tpl_cache[template_id] = (digest, parameters)
     parameters_list = ", ".join(parameters)
     logger.info(f"Found parameters for template {template_id}: {parameters}")
 
-    params_content = f"""Required parameters for properties search template: {parameters_list}
-
-    Parameter descriptions:
-      - bathrooms: Number of bathrooms
-      - tax: Real estate tax amount
-      - maintenance: Maintenance fee amount
-      - square_footage_min: Minimum property square footage. If only a max square footage is provided, set this to 0. otherwise, set this to the minimum square footage specified by the user.
-      - square_footage_max: Maximum property square footage
-      - home_price_min: Minimum home price.  If only a max home price is provided, set this to 0. otherwise, set this to the minimum home price specified by the user.
-      - home_price_max: Maximum home price
-      - property_features: Home features such as AC, pool, updated kitchens, etc should be listed as a single string For example features such as pool and updated kitchen should be formated as pool updated kitchen
-      """
+    params_content = _PARAMS_DOC.format(parameters_list=parameters_list)
 
     params_context = {
         "content": {"type": "text", "text": params_content},
@@ -92,48 +292,91 @@ async def get_properties_template_params() -> Dict[str, Any]:
     return {"type": "object", "parameters": params_context}
 
 
+async def _geocode_once(address: str) -> Dict[str, Any]:
+    client = await _get_client()
+    params = {"address": address, "region": "us", "key": GOOGLE_MAPS_API_KEY}
+
+    # Back off and retry transient Google failures before giving up
+    for attempt in range(GEOCODE_ATTEMPTS):
+        last_attempt = attempt == GEOCODE_ATTEMPTS - 1
+        try:
+            response = await client.get(GEOCODE_URL, params=params)
+        except httpx.TransportError:
+            if last_attempt:
+                raise
+        else:
+            if response.status_code not in _RETRY_STATUSES or last_attempt:
+                break
+        logger.info(f"Retrying geocode for '{address}' (attempt {attempt + 2})")
+        await asyncio.sleep(GEOCODE_BACKOFF * 2**attempt)
+
+    if response.is_error:
+        # Never surface the request URL here: it carries the API key
+        raise RuntimeError(f"Google geocoding HTTP {response.status_code}")
+    return orjson.loads(response.content)
+
+
+def _first_result(data: Dict[str, Any]) -> Dict[str, Any]:
+    return (data.get("results") or [{}])[0]
+
+
 @mcp.tool("geocode_location")
 async def geocode_location(location: str) -> Dict[str, Any]:
     """Geocode a location string into a geo_point."""
 
     try:
-        base_url = "https://maps.googleapis.com/maps/api/geocode/json"
-        params = {
-            "address": location,
-            "region": "us",
-            "key": GOOGLE_MAPS_API_KEY,
-        }
+        cache_key = _geocache_key(location)
+        geo_point = _geocache_get(cache_key)
+        if geo_point is not None:
+            logger.info(f"Geocode cache hit for: '{location}'")
+            return _geocoded_response(location, geo_point)
 
         logger.info(f"Attempting to geocode: '{location}'")
-        response = requests.get(base_url, params=params)
-        data = response.json()
+        attempts = [_geocode_once(location)]
 
-        logger.info(f"Geocoding status: {data.get('status')}")
+        # Fire the "Florida" fallback alongside the primary request
+        if not _STATE_SUFFIX_RE.search(location.strip()):
+            fallback_location = f"{location}, Florida"
+            logger.info(f"Trying fallback concurrently: '{fallback_location}'")
+            attempts.append(_geocode_once(fallback_location))
 
-        if data.get("status") != "OK":
-            logger.error(
-                f"Google API error: {data.get('status')} - {data.get('error_message', 'No detailed error message')}"
-            )
-            return {
-                "content": [
-                    {
-                        "type": "text",
-                        "text": f"Geocoding failed: {data.get('status', 'Unknown error')} for location '{location}'",
-                    }
-                ]
-            }
+        data, *fallback = await asyncio.gather(*attempts, return_exceptions=True)
+        fallback_data = (
+            fallback[0] if fallback and isinstance(fallback[0], dict) else None
+        )
 
-        result = data.get("results", [{}])[0]
+        # Only answers to the original query may be cached under its key
+        cacheable = True
+
+        if isinstance(data, Exception):
+            # The concurrent "Florida" lookup may still have succeeded
+            if fallback_data is None:
+                raise data
+            logger.error(f"Primary geocode failed, using fallback: {str(data)}")
+            result = _first_result(fallback_data)
+            cacheable = False
+        else:
+            logger.info(f"Geocoding status: {data.get('status')}")
+
+            if data.get("status") not in ("OK", "ZERO_RESULTS"):
+                logger.error(
+                    f"Google API error: {data.get('status')} - {data.get('error_message', 'No detailed error message')}"
+                )
+                return {
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": f"Geocoding failed: {data.get('status', 'Unknown error')} for location '{location}'",
+                        }
+                    ]
+                }
 
-        # If no results, try appending "Florida"
-        if not result:
-            logger.info("No results found, trying variations...")
-            fallback_location = f"{location}, Florida"
-            logger.info(f"Trying fallback: '{fallback_location}'")
-            params["address"] = fallback_location
-            fallback_response = requests.get(base_url, params=params)
-            fallback_data = fallback_response.json()
-            result = fallback_data.get("results", [{}])[0]
+            result = _first_result(data)
+
+            # If no results, use the "Florida" variation
+            if not result and fallback_data is not None:
+                logger.info("No results found, using fallback result")
+                result = _first_result(fallback_data)
 
         if (
             not result
@@ -155,21 +398,103 @@ async def geocode_location(location: str) -> Dict[str, Any]:
             "longitude": result["geometry"]["location"]["lng"],
         }
 
-        logger.info(f"Successfully geocoded to: {json.dumps(geo_point)}")
-        return {
-            "content": [
-                {
-                    "type": "text",
-                    "text": f"Geocoded '{location}' to: {json.dumps(geo_point)}",
-                }
-            ],
-            "data": geo_point,
-        }
+        if cacheable:
+            _geocache_put(cache_key, geo_point)
+
+        logger.info(f"Successfully geocoded to: {orjson.dumps(geo_point).decode()}")
+        return _geocoded_response(location, geo_point)
     except Exception as e:
         logger.error(f"Geocoding error: {str(e)}")
         return {"content": [{"type": "text", "text": f"Error: {str(e)}"}]}
 
 
+def _build_hit_formatter() -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Compile a hit formatter with field names and defaults inlined as constants."""
+    items = ", ".join(
+        f"{k!r}: (fields.get({k!r}) or ({default[0]!r},))[0]"
+        for k, default in _FIELD_DEFAULTS.items()
+    )
+    src = (
+        "def _format_hit(hit, _EMPTY=_EMPTY):\n"
+        "    fields = hit.get('fields') or _EMPTY\n"
+        f"    return {{{items}}}\n"
+    )
+    namespace = {"_EMPTY": _EMPTY}
+    exec(src, namespace)
+    return namespace["_format_hit"]
+
+
+_format_hit = _build_hit_formatter()
+
+
+def _build_search_params(
+    original_query: str,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    distance: Optional[int] = None,
+    tax: Optional[float] = None,
+    bedrooms: Optional[int] = None,
+    home_price_min: Optional[float] = None,
+    home_price_max: Optional[float] = None,
+    bathrooms: Optional[float] = None,
+    square_footage: Optional[int] = None,
+    property_features: Optional[str] = None,
+    maintenance: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Normalize tool arguments into search template params."""
+    # Set default distance if lat/long provided but distance not specified
+    if latitude is not None and longitude is not None and distance is None:
+        distance = "25"
+        logger.info(f"Setting default distance to 25")
+
+    # Only add the parameters that were provided
+    params = {"query": original_query}
+    for k, v in (
+        ("latitude", latitude),
+        ("longitude", longitude),
+        ("distance", f"{distance}mi" if distance is not None else None),
+        ("tax", tax),
+        ("bedrooms", bedrooms),
+        ("home_price_min", home_price_min),
+        ("home_price_max", home_price_max),
+        ("bathrooms", bathrooms),
+        ("square_footage", square_footage),
+        ("property_features", property_features),
+        ("maintenance", maintenance),
+    ):
+        if v is not None:
+            params[k] = v
+    return params
+
+
+class SearchQuery(BaseModel):
+    """One multi_search_template query, mirroring search_template's arguments."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    original_query: str
+    query: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    distance: Optional[int] = None
+    tax: Optional[float] = None
+    bedrooms: Optional[int] = None
+    home_price_min: Optional[float] = None
+    home_price_max: Optional[float] = None
+    bathrooms: Optional[float] = None
+    square_footage: Optional[int] = None
+    property_features: Optional[str] = None
+    maintenance: Optional[float] = None
+
+
+def _hits_and_total(response: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], int]:
+    # filter_path drops empty sections entirely, so every level may be missing
+    response_hits = (response or {}).get("hits") or {}
+    hits = response_hits.get("hits") or []
+    total = (response_hits.get("total") or {}).get("value", 0)
+    return hits, total
+
+
 @mcp.tool("search_template")
 async def search_template(
     original_query: str,
@@ -190,44 +515,39 @@ async def search_template(
     logger.info(f"Using template ID: {SEARCH_TEMPLATE_ID} for index: {SEARCH_INDEX}")
     logger.info(f"Original user query: {original_query}")
     try:
-        # Set default distance if lat/long provided but distance not specified
-        if latitude is not None and longitude is not None and distance is None:
-            distance = "25"
-            logger.info(f"Setting default distance to 25")
-
-        params = {
-            "query": original_query,
-            "latitude": latitude,
-            "longitude": longitude,
-            "distance": (f"{distance}mi" if distance is not None else None),
-            "tax": tax,
-            "bedrooms": bedrooms,
-            "home_price_min": home_price_min,
-            "home_price_max": home_price_max,
-            "bathrooms": bathrooms,
-            "square_footage": square_footage,
-            "property_features": property_features,
-            "maintenance": maintenance,
-        }
-
-        # Remove None values
-        params = {k: v for k, v in params.items() if v is not None}
+        params = _build_search_params(
+            original_query,
+            latitude=latitude,
+            longitude=longitude,
+            distance=distance,
+            tax=tax,
+            bedrooms=bedrooms,
+            home_price_min=home_price_min,
+            home_price_max=home_price_max,
+            bathrooms=bathrooms,
+            square_footage=square_footage,
+            property_features=property_features,
+            maintenance=maintenance,
+        )
 
-        logger.info(f"Normalized parameters: {json.dumps(params)}")
+        logger.info(f"Normalized parameters: {orjson.dumps(params).decode()}")
 
-        resp = es.render_search_template(id=SEARCH_TEMPLATE_ID, params=params)
+        es = await _get_es()
 
-        print(resp)
-        logging.info(f"Search template render response: {resp}")
+        # Rendering costs an extra round-trip, so only do it when debugging
+        if logger.isEnabledFor(logging.DEBUG):
+            resp = await es.render_search_template(id=SEARCH_TEMPLATE_ID, params=params)
+            logger.debug(f"Search template render response: {resp}")
 
         # Execute search template
-        response = es.search_template(
-            index=SEARCH_INDEX, id=SEARCH_TEMPLATE_ID, params=params
+        response = await es.search_template(
+            index=SEARCH_INDEX,
+            id=SEARCH_TEMPLATE_ID,
+            params=params,
+            filter_path=_SEARCH_FILTER_PATH,
         )
         logging.info(f"Search template response: {response}")
-        # Extract hits
-        hits = response.get("hits", {}).get("hits", [])
-        total = response.get("hits", {}).get("total", {}).get("value", 0)
+        hits, total = _hits_and_total(response)
 
         if not hits:
             return {
@@ -240,21 +560,7 @@ async def search_template(
             }
 
         # Format results
-        results = []
-        for hit in hits:
-            fields = hit.get("fields", {})
-            logging.info(f"Hit fields: {fields}")
-            result = {
-                "title": fields.get("title", ["No title"])[0],
-                "tax": fields.get("tax", ["N/A"])[0],
-                "maintenance_fee": fields.get("maintenance_fee", ["N/A"])[0],
-                "bathrooms": fields.get("bathrooms", ["N/A"])[0],
-                "bedrooms": fields.get("bedrooms", ["N/A"])[0],
-                "square_footage": fields.get("square_footage", ["N/A"])[0],
-                "home_price": fields.get("home_price", ["N/A"])[0],
-                "property_features": fields.get("property_features", ["N/A"])[0],
-            }
-            results.append(result)
+        results = list(map(_format_hit, hits))
 
         return {
             "content": [
@@ -262,7 +568,10 @@ async def search_template(
                     "type": "text",
                     "text": f"Found {total} properties matching your criteria. Here are the top {len(hits)} results:",
                 },
-                {"type": "text", "text": json.dumps(results, indent=2)},
+                {
+                    "type": "text",
+                    "text": orjson.dumps(results, option=orjson.OPT_INDENT_2).decode(),
+                },
             ],
             "data": {"total": total, "results": results},
         }
@@ -271,5 +580,62 @@ async def search_template(
         return {"content": [{"type": "text", "text": f"Error: {str(e)}"}]}
 
 
+@mcp.tool("multi_search_template")
+async def multi_search_template(queries: List[SearchQuery]) -> Dict[str, Any]:
+    """Execute the search template for several parameter sets in one request.
+
+    Each query takes the same parameters as search_template. Use this instead of
+    repeated search_template calls when comparing variations of a search.
+    """
+    logger.info(f"Running {len(queries)} searches with template: {SEARCH_TEMPLATE_ID}")
+    try:
+        search_templates = []
+        for q in queries:
+            # query is accepted for parity with search_template but unused there too
+            params = _build_search_params(**q.model_dump(exclude={"query"}))
+            search_templates.append({"index": SEARCH_INDEX})
+            search_templates.append({"id": SEARCH_TEMPLATE_ID, "params": params})
+
+        es = await _get_es()
+        response = await es.msearch_template(
+            search_templates=search_templates, filter_path=_MSEARCH_FILTER_PATH
+        )
+
+        content = []
+        responses = []
+        for q, item in zip(queries, response.get("responses") or []):
+            original_query = q.original_query
+            if "error" in item:
+                content.append(
+                    {
+                        "type": "text",
+                        "text": f"Search failed for query: {original_query}. Error: {item['error']}",
+                    }
+                )
+                responses.append({"error": item["error"]})
+                continue
+
+            hits, total = _hits_and_total(item)
+            results = list(map(_format_hit, hits))
+            content.append(
+                {
+                    "type": "text",
+                    "text": f"Found {total} properties for query: {original_query}. Here are the top {len(hits)} results:",
+                }
+            )
+            content.append(
+                {
+                    "type": "text",
+                    "text": orjson.dumps(results, option=orjson.OPT_INDENT_2).decode(),
+                }
+            )
+            responses.append({"total": total, "results": results})
+
+        return {"content": content, "data": {"responses": responses}}
+    except Exception as e:
+        logger.error(f"Multi search template failed: {str(e)}")
+        return {"content": [{"type": "text", "text": f"Error: {str(e)}"}]}
+
+
 if __name__ == "__main__":
     mcp.run()
@@ -1,7 +1,10 @@
 import os
+import sys
+import time
 from elasticsearch import Elasticsearch, helpers
 from dotenv import load_dotenv
 import json
+import ijson
 
 load_dotenv()
 
@@ -24,11 +27,37 @@ PROPERTY_LISTINGS = "./data/florida_properties.json"
 
 RAW_INDEX_MAPPING_FILE = "./data/raw_index_mapping.json"
 
+# Index settings used while bulk loading, restored once ingest completes
+INGEST_INDEX_SETTINGS = {
+    "refresh_interval": "-1",
+    "number_of_replicas": 0,
+    "translog": {
+        "durability": "async",
+        "sync_interval": "30s",
+        "flush_threshold_size": "1gb",
+    },
+}
+# None resets a setting to its default, keeping search-idle refresh skipping and
+# the cluster's replica count. sync_interval is static; it only applies to async
+# durability anyway.
+SEARCH_INDEX_SETTINGS = {
+    "refresh_interval": None,
+    "number_of_replicas": None,
+    "translog": {"durability": None, "flush_threshold_size": None},
+}
+
+# Minimum seconds between progress updates during bulk indexing
+PROGRESS_INTERVAL = 1.0
+
 
 def connect_to_elasticsearch():
     try:
-        es = Elasticsearch(hosts=[ELASTIC_ENDPOINT], api_key=ELASTIC_API_KEY).options(
-            request_timeout=600
+        es = Elasticsearch(
+            hosts=[ELASTIC_ENDPOINT],
+            api_key=ELASTIC_API_KEY,
+            http_compress=True,
+            request_timeout=600,
+            connections_per_node=16,
         )
         connected = es.ping()
         print(f"1. ✅ Connected to Elasticsearch: {connected}")
@@ -42,7 +71,7 @@ def load_index_mapping(mapping_file):
     """Load index mapping from external JSON file"""
     try:
         with open(mapping_file, "r") as f:
-            mapping_content = f.read()
+            mapping_content = json.load(f)
         print(f"2. ✅ Loaded index mapping from {mapping_file}")
         return mapping_content
     except FileNotFoundError:
@@ -60,10 +89,34 @@ def create_properties_index(index_mappings):
         es.indices.delete(index=INDEX_NAME)
         print(f"\t🗑️ Previous index '{INDEX_NAME}' deleted.")
 
+    # Skip refreshes, replication and per-request fsyncs until the bulk load is done
+    settings = index_mappings.setdefault("settings", {})
+    settings.setdefault("index", {}).update(INGEST_INDEX_SETTINGS)
+
     es.indices.create(index=INDEX_NAME, body=index_mappings)
     print(f"\t✅ Index '{INDEX_NAME}' created.")
 
 
+def restore_index_settings():
+    """Restore search-time index settings, whether or not ingest succeeded"""
+    end_progress()
+    print(f"8. ⚙️ Restoring index settings for '{INDEX_NAME}'...")
+    es.indices.put_settings(index=INDEX_NAME, body={"index": SEARCH_INDEX_SETTINGS})
+    # Writes acknowledged under async translog durability may not be fsynced yet
+    es.indices.flush(index=INDEX_NAME)
+    print(f"\t✅ Index '{INDEX_NAME}' settings restored.")
+
+
+def merge_properties_index():
+    """Merge segments once ingest has completed"""
+    print(f"9. 🧩 Merging segments for '{INDEX_NAME}'...")
+    es.indices.forcemerge(
+        index=INDEX_NAME, max_num_segments=1, wait_for_completion=True
+    )
+    es.indices.refresh(index=INDEX_NAME)
+    print(f"\t✅ Index '{INDEX_NAME}' segments merged.")
+
+
 # Load search template from external file
 def load_search_template(template_file):
     """Load search template content from external file"""
@@ -87,45 +140,75 @@ def create_search_template(template_id=TEMPLATE_ID, template_content=None):
         print(f"\t❌ Error creating template '{template_id}': {e}")
 
 
-def load_data_set():
-    # load PROPERTY_LISTINGS into dataset as json
-    with open(PROPERTY_LISTINGS, "r") as f:
-        data_set = json.load(f)
-        print(f"6. ✅ Loaded property listings from {PROPERTY_LISTINGS}")
-        return data_set
+def iter_data_set():
+    # stream PROPERTY_LISTINGS one listing at a time instead of loading the whole file
+    with open(PROPERTY_LISTINGS, "rb") as f:
+        yield from ijson.items(f, "item", use_float=True)
+
+
+_progress_open = False
+
+
+def report_progress(message):
+    """Overwrite the current progress line on stderr"""
+    global _progress_open
+    sys.stderr.write(f"\r\t{message:<50}")
+    sys.stderr.flush()
+    _progress_open = True
+
+
+def end_progress():
+    """Terminate an open progress line so following output starts on its own line"""
+    global _progress_open
+    if _progress_open:
+        sys.stderr.write("\n")
+        sys.stderr.flush()
+        _progress_open = False
 
 
 # Parallel bulk loading of property data into Elasticsearch
-def parallel_bulk_load(data_set):
+def parallel_bulk_load():
 
     def generate_actions():
         doc_count = 0
-        for line in data_set:
+        last_report = time.monotonic()
+        for line in iter_data_set():
             doc_count += 1
-            if doc_count % 100 == 0:
-                print(f"\t📊 Processing {doc_count} documents...")
+            now = time.monotonic()
+            if now - last_report > PROGRESS_INTERVAL:
+                report_progress(f"📊 Processing {doc_count} documents...")
+                last_report = now
             yield {"_index": INDEX_NAME, "_source": line}
 
+        end_progress()
         print("\t=====================================")
         print(f"\t📊 Total documents to index: {doc_count}")
 
+    # iter_data_set is lazy, so announce the stream before indexing consumes it
+    print(f"6. ✅ Streaming property listings from {PROPERTY_LISTINGS}")
     print("7. 🚀 Starting parallel bulk indexing...")
     success_count = 0
     error_count = 0
     failed_docs = []  # Track failed documents
+    last_report = time.monotonic()
 
-    chunk_size = 50
+    chunk_size = 1000
 
     for ok, result in helpers.parallel_bulk(
         es,
         actions=generate_actions(),
-        thread_count=4,
+        thread_count=min(8, os.cpu_count() or 4),
         chunk_size=chunk_size,
+        max_chunk_bytes=10 * 1024 * 1024,
+        queue_size=8,
+        raise_on_error=False,
     ):
         if ok:
             success_count += 1
-            if success_count % 250 == 0:
-                print(f"\t✅ Successfully indexed {success_count} documents...")
+            now = time.monotonic()
+            if now - last_report > PROGRESS_INTERVAL:
+                report_progress(f"✅ Successfully indexed {success_count} documents...")
+                last_report = now
         else:
             error_count += 1
             # Capture detailed error information
@@ -142,25 +225,31 @@ def parallel_bulk_load(data_set):
             failed_docs.append(error_info)
 
             if error_count % 100 == 0:
+                end_progress()
                 print(f"❌ Encountered {error_count} errors...")
             elif error_count <= 10:  # Show first 10 errors immediately
+                end_progress()
                 print(
                     f"❌ Error {error_count}: {error_info['error_type']} - {error_info['error_reason']}"
                 )
 
-        if error_count > 0:
-            print(f"⚠️ Encountered {error_count} errors during indexing")
+    report_progress(f"✅ Successfully indexed {success_count} documents")
+    end_progress()
 
-            # Report failed documents in detail
-            print(f"\n🔍 DETAILED ERROR REPORT:")
-            print(f"Total errors: {error_count}")
-            print(f"Failed documents:")
-            for i, failed_doc in enumerate(failed_docs, 1):
-                print(
-                    f"  {i}. Line {failed_doc.get('line_number', 'unknown')}: {failed_doc.get('error_type', 'unknown')} - {failed_doc.get('error_reason', 'unknown')}"
-                )
+    if error_count > 0:
+        print(f"⚠️ Encountered {error_count} errors during indexing")
+
+        # Report failed documents in detail
+        print(f"\n🔍 DETAILED ERROR REPORT:")
+        print(f"Total errors: {error_count}")
+        print(f"Failed documents:")
+        for i, failed_doc in enumerate(failed_docs, 1):
+            print(
+                f"  {i}. Line {failed_doc.get('line_number', 'unknown')}: {failed_doc.get('error_type', 'unknown')} - {failed_doc.get('error_reason', 'unknown')}"
+            )
 
     # Verify the final document count
+    es.indices.refresh(index=INDEX_NAME)
     final_count = es.count(index=INDEX_NAME)["count"]
 
     print(f"📊 Final document count in '{INDEX_NAME}': {final_count}")
@@ -181,11 +270,15 @@ search_template_content = load_search_template(SEARCH_TEMPLATE_FILE)
 # Create the search template
 create_search_template(template_content=search_template_content)
 
-# Load Florida properties from local json file
-properties_list = load_data_set()
+# Stream Florida properties from local json file into the Elasticsearch Index,
+# restoring index settings even if ingest fails
+try:
+    parallel_bulk_load()
+finally:
+    restore_index_settings()
 
-# Add properties to Elasticsearch Index
-parallel_bulk_load(properties_list)
+# Merge segments now that ingest is complete
+merge_properties_index()
 
 print("🎉 Property data ingestion and processing complete!")
 print(f"📋 Final index '{INDEX_NAME}' is ready for semantic search")